@@ -9,6 +9,10 @@ Features:
   - CLI interface with argparse for DB-ID and output directory
   - Exit codes: 1=config, 2=API, 3=IO
   - Idempotent: only updates changed files and deletes archived ones
+  - Concurrent: pages are written in threads while the next batch is fetched
+  - Incremental: pages unchanged since the last run (per Notion's
+    last_edited_time, tracked in <output>/.notion_cache.json) are not
+    rewritten; pass --no-cache to force a full export
 
 Environment variables (required unless overridden via CLI):
   NOTION_API_KEY       – Secret integration token with read access to the DB
@@ -28,18 +32,29 @@ Example with .env:
 """
 from __future__ import annotations
 import os
-import re
+import string
+import asyncio
 import sys
 import json
+import tempfile
 import logging
 import argparse
 from pathlib import Path
-from typing import Any, Dict, List
-from datetime import datetime
+from typing import Any, Callable, Dict, List, Set, Tuple
+from datetime import datetime, timezone
 
+import httpx
+import yaml
 from dotenv import load_dotenv  # type: ignore
-from notion_client import Client, APIResponseError  # type: ignore
-from ruamel.yaml import YAML  # type: ignore
+from notion_client import AsyncClient, APIResponseError  # type: ignore
+
+from prompt_files import iter_yaml
+
+# Emit through libyaml (C) when available, else the pure-Python dumper
+try:
+    from yaml import CSafeDumper as _DUMPER
+except ImportError:
+    from yaml import SafeDumper as _DUMPER  # type: ignore
 
 # Load .env if present
 load_dotenv()
@@ -48,35 +63,125 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
+# Upper bound for pages being extracted/written at the same time
+MAX_CONCURRENCY = 8
+
+# Manifest in the output directory: page_id -> {"last_edited_time", "path"}
+CACHE_FILE = ".notion_cache.json"
+
+# Category directories already created during this run (shared by writer threads;
+# a race only repeats an idempotent mkdir)
+_MKDIR_CACHE: Set[Path] = set()
+
+class _SlugTable(dict):
+    """str.translate table: keeps [a-z0-9], maps every other code point to '-'."""
+    def __missing__(self, key: int) -> str:
+        return "-"
+
+
+_SLUG_TABLE = _SlugTable({c: "-" for c in range(128)})
+_SLUG_TABLE.update({ord(c): c for c in string.ascii_lowercase + string.digits})
+
+
 def slugify(text: str) -> str:
-    s = text.lower()
-    s = re.sub(r"[^a-z0-9]+", "-", s)
-    return s.strip("-")
+    parts = text.lower().translate(_SLUG_TABLE).split("-")
+    return "-".join(p for p in parts if p)
 
 
-def notion_rich_text_to_str(rich: List[Dict[str, Any]]) -> str:
-    return "".join(part.get("plain_text", "") for part in rich)
+# Extraction expression per Notion property type; {v} is the property object.
+# Both the generic handlers and the schema-specialised extractor below are
+# generated from this one table, so the two paths always agree.
+_TYPE_EXPRS: Dict[str, str] = {
+    "title": '"".join([t.get("plain_text", "") for t in {v}["title"]])',
+    "rich_text": '"".join([t.get("plain_text", "") for t in {v}["rich_text"]])',
+    "select": '({v}["select"] or _EMPTY).get("name")',
+    "multi_select": '[o["name"] for o in {v}["multi_select"]]',
+    "people": '[u.get("name", "") for u in {v}["people"]]',
+}
+_EXPR_GLOBALS: Dict[str, Any] = {"_EMPTY": {}}
 
+# One extractor per Notion property type, dispatched on the property's "type"
+_PROPERTY_HANDLERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    t: eval(f"lambda v: {expr.format(v='v')}", _EXPR_GLOBALS)
+    for t, expr in _TYPE_EXPRS.items()
+}
 
-def extract_properties(page: Dict[str, Any]) -> Dict[str, Any]:
-    props = page.get("properties", {})
-    def get(key: str, default=None):
-        val = props.get(key, {})
-        t = val.get("type")
-        return val.get(t, default)
-
-    name = notion_rich_text_to_str(get("Name", [])) or "untitled"
-    system_prompt = notion_rich_text_to_str(get("System Prompt", []))
-    user_template = notion_rich_text_to_str(get("User Template", []))
-    category = get("Kategorie", {}).get("name", "uncategorised")
-    tags = [t.get("name") for t in get("Tags", [])] if props.get("Tags") else []
-    version = get("Version", "0.1.0")
-    qdims = [d.get("name") for d in get("Qualitäts-Dims", [])] if props.get("Qualitäts-Dims") else []
-    license_ = get("Lizenz", {}).get("name", "internal")
-    authors = [p.get("person", {}).get("name", "") for p in get("Autor", {}).get("people", [])]
 
+def _extract_values(props: Dict[str, Any]) -> Dict[str, Any]:
     return {
-        "name": f"fit/{slugify(category)}/{slugify(name)}@{version}",
+        k: _PROPERTY_HANDLERS[v["type"]](v)
+        for k, v in props.items()
+        if v.get("type") in _PROPERTY_HANDLERS
+    }
+
+
+# Properties of the prompt database as configured in Notion: name -> type
+_SCHEMA: Dict[str, str] = {
+    "Name": "title",
+    "System Prompt": "rich_text",
+    "User Template": "rich_text",
+    "Kategorie": "select",
+    "Tags": "multi_select",
+    "Version": "rich_text",
+    "Qualitäts-Dims": "multi_select",
+    "Lizenz": "select",
+    "Autor": "people",
+}
+
+
+def _compile_extractor(schema: Dict[str, str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Generate a straight-line equivalent of _extract_values for ``schema``.
+
+    The generated function reads exactly the known properties with direct
+    subscripts. It raises KeyError when a page does not match the schema
+    (missing property or different type), so callers can fall back to the
+    generic handler-table path.
+    """
+    keys = list(schema)
+    types = ", ".join(f"props[{k!r}][\"type\"]" for k in keys)
+    fields = "\n".join(
+        f"        {k!r}: {_TYPE_EXPRS[schema[k]].format(v=f'props[{k!r}]')},"
+        for k in keys
+    )
+    src = (
+        "def _extract_values_fast(props):\n"
+        f"    if ({types},) != _TYPES:\n"
+        "        raise KeyError(\"schema mismatch\")\n"
+        "    return {\n"
+        f"{fields}\n"
+        "    }\n"
+    )
+    ns: Dict[str, Any] = {**_EXPR_GLOBALS, "_TYPES": tuple(schema[k] for k in keys)}
+    exec(compile(src, "<notion_export:_extract_values_fast>", "exec"), ns)
+    return ns["_extract_values_fast"]
+
+
+_extract_values_fast = _compile_extractor(_SCHEMA)
+
+
+def extract_properties(page: Dict[str, Any], exported_at: str) -> Tuple[Dict[str, Any], str, str]:
+    """Return the prompt document plus its category and filename slugs."""
+    props = page.get("properties", {})
+    try:
+        values = _extract_values_fast(props)
+    except (KeyError, TypeError):
+        values = _extract_values(props)
+
+    name = values.get("Name") or "untitled"
+    system_prompt = values.get("System Prompt") or ""
+    user_template = values.get("User Template") or ""
+    category = values.get("Kategorie") or "uncategorised"
+    tags = values.get("Tags") or []
+    version = values.get("Version") or "0.1.0"
+    qdims = values.get("Qualitäts-Dims") or []
+    license_ = values.get("Lizenz") or "internal"
+    authors = values.get("Autor") or []
+
+    category_slug = slugify(category)
+    filename_slug = slugify(name)
+
+    prompt = {
+        "name": f"fit/{category_slug}/{filename_slug}@{version}",
         "description": (user_template.split("\n", 1)[0][:100] if user_template else name),
         "tags": tags,
         "template": f"""<system>\n{system_prompt}\n</system>\n<user>\n{user_template}\n</user>""",
@@ -85,26 +190,50 @@ def extract_properties(page: Dict[str, Any]) -> Dict[str, Any]:
             "authors": authors or ["Unknown"],
             "version": version,
             "license": license_,
-            "exported_at": datetime.utcnow().isoformat() + "Z",
+            "exported_at": exported_at,
             "notion_page_id": page.get("id"),
         },
     }
+    return prompt, category_slug, filename_slug
 
 
-def write_yaml(prompt: Dict[str, Any], output_dir: Path) -> Path:
-    _, filename_with_version = prompt["name"].split("/", 2)
-    filename, _ = filename_with_version.split("@", 1)
-    category = prompt["name"].split("/")[1]
+def write_yaml(prompt: Dict[str, Any], output_dir: Path, category: str, filename: str) -> Path:
     target_dir = output_dir / category
-    target_dir.mkdir(parents=True, exist_ok=True)
+    if target_dir not in _MKDIR_CACHE:
+        target_dir.mkdir(parents=True, exist_ok=True)
+        _MKDIR_CACHE.add(target_dir)
     path = target_dir / f"{filename}.yaml"
-    with path.open("w", encoding="utf-8") as fh:
-        yaml.dump(prompt, fh)
-    logger.info(f"✓ {path.relative_to(Path.cwd())}")
+    data = yaml.dump(
+        prompt,
+        None,
+        _DUMPER,
+        default_flow_style=False,
+        explicit_start=True,
+        sort_keys=False,
+        allow_unicode=True,
+        indent=2,
+        encoding="utf-8",
+    )
+    # Single write to a temp file, then an atomic rename: readers (and a crashed
+    # run) never see a half-written YAML. The temp name is unique per call, as
+    # pages with colliding slugs are written concurrently.
+    fd, tmp = tempfile.mkstemp(dir=target_dir, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            os.fchmod(fh.fileno(), 0o644)
+            fh.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    logger.info(f"✓ {os.path.relpath(path)}")
     return path
 
 
-def delete_removed(existing: List[Path], retained: List[Path]) -> None:
+def delete_removed(existing: List[Path], retained: Set[Path]) -> None:
     for path in existing:
         if path not in retained:
             try:
@@ -115,14 +244,99 @@ def delete_removed(existing: List[Path], retained: List[Path]) -> None:
                 sys.exit(3)
 
 
+def load_cache(path: Path) -> Dict[str, Dict[str, str]]:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_cache(path: Path, cache: Dict[str, Dict[str, str]]) -> None:
+    try:
+        path.write_text(json.dumps(cache, indent=2, sort_keys=True), encoding="utf-8")
+    except OSError as e:
+        logger.error(f"ERROR writing {path}: {e}")
+        sys.exit(3)
+
+
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(description="Export prompts from Notion to YAML files")
     p.add_argument("--db-id", help="Notion Database ID", default=os.getenv("NOTION_DATABASE_ID"))
     p.add_argument("--output", help="Output directory", default=os.getenv("OUTPUT_DIR", "prompts"))
     p.add_argument("--page-size", type=int, help="Notion page size (1–100)", default=int(os.getenv("PAGE_SIZE", "100")))
+    p.add_argument("--no-cache", action="store_true", help=f"Ignore {CACHE_FILE} and re-export every page")
     return p.parse_args()
 
 
+async def export_pages(
+    client: AsyncClient,
+    db_id: str,
+    page_size: int,
+    output_dir: Path,
+    exported_at: str,
+    cache: Dict[str, Dict[str, str]],
+) -> Tuple[Set[Path], Dict[str, Dict[str, str]]]:
+    """Stream database pages from Notion and write each one as YAML.
+
+    The writes for one query batch run in worker threads, gathered together
+    with the request for the next batch, so disk I/O overlaps with the
+    network round trip. Pages whose ``last_edited_time`` matches ``cache``
+    and whose file is still on disk are not written again.
+
+    Returns the retained paths and the cache entries for this run.
+    """
+    retained: Set[Path] = set()
+    manifest: Dict[str, Dict[str, str]] = {}
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def process(page: Dict[str, Any]) -> None:
+        edited = page.get("last_edited_time", "")
+        cached = cache.get(page["id"])
+        if cached and cached["last_edited_time"] == edited:
+            path = output_dir / cached["path"]
+            if path.is_file():
+                retained.add(Path(os.path.abspath(path)))
+                manifest[page["id"]] = cached
+                return
+        async with sem:
+            prompt, category, filename = extract_properties(page, exported_at)
+            path = await asyncio.to_thread(write_yaml, prompt, output_dir, category, filename)
+        retained.add(Path(os.path.abspath(path)))
+        manifest[page["id"]] = {
+            "last_edited_time": edited,
+            "path": path.relative_to(output_dir).as_posix(),
+        }
+
+    query: Dict[str, Any] = {
+        "database_id": db_id,
+        "page_size": page_size,
+        # Let Notion drop untitled rows server-side; archived pages are never
+        # returned by a database query
+        "filter": {"and": [{"property": "Name", "title": {"is_not_empty": True}}]},
+    }
+    resp = await client.databases.query(**query)
+    while True:
+        writes = [process(page) for page in resp.get("results", [])]
+        if not resp.get("has_more", False):
+            await asyncio.gather(*writes)
+            break
+        query["start_cursor"] = resp.get("next_cursor")
+        resp, *_ = await asyncio.gather(client.databases.query(**query), *writes)
+
+    return retained, manifest
+
+
+async def run(
+    api_key: str, args: argparse.Namespace, output_dir: Path, exported_at: str, cache: Dict[str, Dict[str, str]]
+) -> Tuple[Set[Path], Dict[str, Dict[str, str]]]:
+    # One pooled HTTP/2 connection multiplexes all Notion calls of the run. The
+    # httpx client is the context manager: AsyncClient.__aenter__ would replace
+    # an injected client with a fresh HTTP/1.1 one.
+    async with httpx.AsyncClient(http2=True) as http:
+        client = AsyncClient(auth=api_key, client=http)
+        return await export_pages(client, args.db_id, args.page_size, output_dir, exported_at, cache)
+
+
 def main() -> None:
     args = parse_args()
     api_key = os.getenv("NOTION_API_KEY")
@@ -130,40 +344,24 @@ def main() -> None:
         logger.error("ERROR: NOTION_API_KEY and NOTION_DATABASE_ID must be set.")
         sys.exit(1)
 
-    client = Client(auth=api_key)
-    yaml = YAML()
-    yaml.default_flow_style = False
-    yaml.indent(mapping=2, sequence=4, offset=2)
-    yaml.explicit_start = True
-
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = output_dir / CACHE_FILE
+    cache = {} if args.no_cache else load_cache(cache_path)
 
-    retained: List[Path] = []
+    # One timestamp for the whole export snapshot
+    exported_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     try:
-        has_more = True
-        cursor = None
-        while has_more:
-            resp = client.databases.query(
-                database_id=args.db_id,
-                page_size=args.page_size,
-                start_cursor=cursor,
-            ) if cursor else client.databases.query(
-                database_id=args.db_id,
-                page_size=args.page_size,
-            )
-            for page in resp.get("results", []):
-                if page.get("archived"): continue
-                prompt = extract_properties(page)
-                path = write_yaml(prompt, output_dir)
-                retained.append(path.resolve())
-            has_more = resp.get("has_more", False)
-            cursor = resp.get("next_cursor")
+        retained, manifest = asyncio.run(run(api_key, args, output_dir, exported_at, cache))
     except APIResponseError as exc:
         logger.error(f"Notion API error: {exc}")
         sys.exit(2)
+    except OSError as exc:
+        logger.error(f"ERROR writing YAML: {exc}")
+        sys.exit(3)
 
-    existing = [p.resolve() for p in Path(args.output).rglob("*.yaml")]
+    save_cache(cache_path, manifest)
+    existing = [Path(p) for p in iter_yaml(output_dir)]
     delete_removed(existing, retained)
     logger.info("Export complete.")
 
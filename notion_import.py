@@ -3,15 +3,30 @@
 notion_import.py — Importiert lokale YAML-Prompts in deine Notion-Datenbank.
 Erwartet im aktuellen Verzeichnis ein Unterverzeichnis `prompts/` mit YAML-Dateien.
 Liest die Umgebungsvariablen NOTION_API_KEY und NOTION_DATABASE_ID.
-Führt ein „Upsert“ durch: findet eine bestehende Page per Titel, updated sie,
-oder legt sie neu an. Speichert Page-ID ↔ Slug in page_map.json.
+Führt ein „Upsert“ durch: findet eine bestehende Page per Titel (höchstens ein
+Scan der Datenbank pro Lauf), updated sie, oder legt sie neu an.
+Speichert Page-ID ↔ Slug in page_map.json, zusammen mit einem Hash je Datei –
+unveränderte YAMLs werden ohne API-Call übersprungen.
+Die Requests laufen parallel (asyncio, begrenzt) mit Backoff bei HTTP 429.
 """
 import os
+import re
 import sys
-import json
+import asyncio
+import orjson
+import mmap
+import hashlib
+import httpx
 import yaml
 from pathlib import Path
-from notion_client import Client, APIResponseError
+from notion_client import AsyncClient, APIResponseError
+from prompt_files import iter_yaml
+
+# libyaml (C) parsen lassen, falls verfügbar – sonst reiner Python-Parser
+try:
+    from yaml import CSafeLoader as _LOADER
+except ImportError:
+    from yaml import SafeLoader as _LOADER
 
 # ---- Config ----
 API_KEY = os.getenv("NOTION_API_KEY")
@@ -20,46 +35,96 @@ if not API_KEY or not DB_ID:
     print("ERROR: Bitte NOTION_API_KEY und NOTION_DATABASE_ID setzen.", file=sys.stderr)
     sys.exit(1)
 
-client = Client(auth=API_KEY)
+MAX_CONCURRENCY = 5   # parallele Notion-Requests (Rate-Limit: ~3 req/s im Mittel)
+MAX_RETRIES     = 5   # Versuche pro Request bei HTTP 429
+
+# <system>…</system> und <user>…</user> in einem Durchlauf aus dem Template holen
+_TPL_RE = re.compile(r"<system>\n(.*?)\n</system>\n<user>\n(.*?)\n</user>", re.DOTALL)
+
+# Eine HTTP/2-Verbindung für alle Requests: TLS-Handshake nur einmal, Multiplexing
+client = AsyncClient(auth=API_KEY, client=httpx.AsyncClient(http2=True))
 page_map_path = Path("page_map.json")
 
-# Lade ggf. vorhandenes Mapping
+# Lade ggf. vorhandenes Mapping: {"pages": {slug: page_id}, "hashes": {slug: sha256}}
 try:
-    slug_to_id = json.loads(page_map_path.read_text(encoding="utf-8"))
-except (FileNotFoundError, json.JSONDecodeError):
-    slug_to_id = {}
+    page_map = orjson.loads(page_map_path.read_bytes())
+except (FileNotFoundError, orjson.JSONDecodeError):
+    page_map = {}
+if "pages" not in page_map:  # altes Format: flaches Slug → Page-ID-Mapping
+    page_map = {"pages": page_map}
+slug_to_id  = page_map["pages"]
+slug_hashes = page_map.setdefault("hashes", {})
 
-def find_page_by_title(title: str) -> str | None:
-    """Versucht, eine existierende Notion-Page mit genau diesem Title zu finden."""
+async def with_backoff(call, **kwargs):
+    """Führt einen Notion-Call aus; bei HTTP 429 mit exponentiellem Backoff erneut."""
+    delay = 1.0
+    for attempt in range(MAX_RETRIES):
+        try:
+            return await call(**kwargs)
+        except APIResponseError as e:
+            if e.status != 429 or attempt == MAX_RETRIES - 1:
+                raise
+            await asyncio.sleep(delay)
+            delay *= 2
+
+async def load_title_index() -> dict[str, str]:
+    """Liest die Datenbank einmal komplett und liefert ein Mapping Title → Page-ID."""
+    title_to_id: dict[str, str] = {}
+    query = {"database_id": DB_ID, "page_size": 100}
     try:
-        resp = client.databases.query(
-            database_id=DB_ID,
-            filter={
-                "property": "Name",
-                "title": {"equals": title}
-            }
-        )
-        results = resp.get("results", [])
-        if results:
-            return results[0]["id"]
+        while True:
+            resp = await with_backoff(client.databases.query, **query)
+            for page in resp.get("results", []):
+                title = "".join(t.get("plain_text", "") for t in page["properties"]["Name"]["title"])
+                if title:
+                    title_to_id.setdefault(title, page["id"])
+            if not resp.get("has_more"):
+                break
+            query["start_cursor"] = resp["next_cursor"]
     except APIResponseError as e:
-        print(f"ERROR beim Suchen von '{title}': {e}", file=sys.stderr)
-    return None
+        print(f"ERROR beim Laden der Datenbank: {e}", file=sys.stderr)
+        sys.exit(2)
+    return title_to_id
+
+_title_index: dict[str, str] | None = None
+_title_index_lock = asyncio.Lock()
 
-def upsert_prompt(file_path: Path):
+async def get_title_index() -> dict[str, str]:
+    """Title-Index, erst beim ersten Bedarf geladen – ein Lauf ohne Änderungen
+    stellt so keine einzige Notion-Anfrage."""
+    global _title_index
+    async with _title_index_lock:
+        if _title_index is None:
+            _title_index = await load_title_index()
+    return _title_index
+
+def load_yaml(file_path: Path):
+    """Parst eine YAML direkt aus einem mmap der Datei (ohne Kopie als str).
+
+    Liefert (Daten, SHA-256 des Dateiinhalts).
+    """
+    with file_path.open("rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return None, ""  # leere Dateien lassen sich nicht mappen
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            digest = hashlib.sha256(mm).hexdigest()
+            return yaml.load(mm, _LOADER), digest
+
+async def upsert_prompt(file_path: Path):
     """Lädt eine YAML, extrahiert Felder und erstellt/updated die Page in Notion."""
-    data = yaml.safe_load(file_path.read_text(encoding="utf-8"))
+    data, digest = load_yaml(file_path)
+    if not data:
+        print(f"Skipping empty file: {file_path}", file=sys.stderr)
+        return
     name = data.get("name", file_path.stem)
+    if slug_to_id.get(name) and slug_hashes.get(name) == digest:
+        print(f"Unchanged: {name}", file=sys.stderr)
+        return
     print(f"Processing: {name}", file=sys.stderr)
 
     # Extrahiere System- und User-Prompt
-    tpl = data.get("template","")
-    try:
-        system_txt = tpl.split("</system>")[0].replace("<system>\n", "")
-        user_txt   = tpl.split("</user>")[-2].split("<user>\n")[-1]
-    except Exception:
-        system_txt = ""
-        user_txt   = ""
+    m = _TPL_RE.search(data.get("template") or "")
+    system_txt, user_txt = m.groups() if m else ("", "")
 
     props = {
         "Name":           {"title":       [{"text": {"content": name}}]},
@@ -71,28 +136,43 @@ def upsert_prompt(file_path: Path):
     }
 
     # Upsert-Logic
-    page_id = slug_to_id.get(name) or find_page_by_title(name)
+    page_id = slug_to_id.get(name) or (await get_title_index()).get(name)
     if page_id:
+        slug_to_id[name] = page_id
         try:
-            client.pages.update(page_id=page_id, properties=props)
+            await with_backoff(client.pages.update, page_id=page_id, properties=props)
+            slug_hashes[name] = digest
             print(f"Updated: {name}", file=sys.stderr)
         except APIResponseError as e:
             print(f"ERROR updating '{name}': {e}", file=sys.stderr)
             sys.exit(2)
     else:
         try:
-            res = client.pages.create(parent={"database_id": DB_ID}, properties=props)
+            res = await with_backoff(client.pages.create, parent={"database_id": DB_ID}, properties=props)
             slug_to_id[name] = res["id"]
+            slug_hashes[name] = digest
             print(f"Created: {name}", file=sys.stderr)
         except APIResponseError as e:
             print(f"ERROR creating '{name}': {e}", file=sys.stderr)
             sys.exit(2)
 
+async def upsert_all(paths: list[Path]):
+    """Upsertet alle Dateien parallel, begrenzt auf MAX_CONCURRENCY gleichzeitige Requests."""
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def sem_upsert(file_path: Path):
+        async with sem:
+            await upsert_prompt(file_path)
+
+    try:
+        await asyncio.gather(*[sem_upsert(p) for p in paths])
+    finally:
+        await client.aclose()
+
 def main():
-    for file in sorted(Path("prompts").rglob("*.yaml")):
-        upsert_prompt(file)
+    asyncio.run(upsert_all(sorted(Path(p) for p in iter_yaml("prompts"))))
     # Speichere aktualisiertes Mapping
-    page_map_path.write_text(json.dumps(slug_to_id, indent=2), encoding="utf-8")
+    page_map_path.write_bytes(orjson.dumps(page_map, option=orjson.OPT_INDENT_2))
     print("Import complete.", file=sys.stderr)
 
 if __name__ == "__main__":
@@ -0,0 +1,24 @@
+"""prompt_files.py — Filesystem helpers shared by notion_import.py and notion_export.py."""
+from __future__ import annotations
+import os
+from typing import Iterator
+
+
+def iter_yaml(root: str | os.PathLike) -> Iterator[str]:
+    """Yield absolute paths of all *.yaml files below root.
+
+    Uses os.scandir, whose entries already carry the file type, so no extra
+    stat/resolve calls are needed per file. A missing root yields nothing,
+    like Path.rglob.
+    """
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        return
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".yaml") and entry.is_file():
+                    yield entry.path